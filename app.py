@@ -1,8 +1,8 @@
+import os
+from typing import NamedTuple
 import streamlit as st
 import pandas as pd
-import pickle
-import math
-import altair as alt
+import numpy as np
 
 # ---
 # Why my code based on 3 - 5 kpis
@@ -25,32 +25,123 @@ import altair as alt
 
 
 # --- 1. LOAD PRE-TRAINED MODELS ---
-@st.cache_resource
-def load_models(model_filepath='trained_models.pkl'):
+MODEL_FILEPATH = 'trained_models.pkl'
+
+@st.cache_resource(show_spinner=False)
+def load_models(model_filepath=MODEL_FILEPATH):
     """Loads the dictionary of trained models from a file."""
+    import gc
+    import pickle
+
     try:
         with open(model_filepath, 'rb') as f:
             models = pickle.load(f)
+        # Free the unpickler's temporary objects before the models are cached for the session.
+        gc.collect()
         return models
     except FileNotFoundError:
         st.error(f"Error: The model file '{model_filepath}' was not found. Please run 'model_training.py' first.")
         return None
 
 # --- 2. DEFINE BUSINESS LOGIC (ASSUMPTIONS) ---
+COMMISSION_RATE = 0.05
+
+class VehicleModel(NamedTuple):
+    """Per-unit economics assumed for one vehicle model."""
+    revenue: int
+    cost_of_sales: int
+    profit_per_unit: int
+
+    @classmethod
+    def from_prices(cls, revenue, cost_of_sales):
+        """Builds the entry, deriving profit per unit after sales commission (in whole dollars)."""
+        return cls(revenue, cost_of_sales, revenue - cost_of_sales - round(revenue * COMMISSION_RATE))
+
 BUSINESS_LOGIC = {
-    'Outlander': {'revenue': 30000, 'cost_of_sales': 25000},
-    'RVR': {'revenue': 24000, 'cost_of_sales': 20000},
-    'Eclipse Cross': {'revenue': 28000, 'cost_of_sales': 24000},
-    'Mirage': {'revenue': 18000, 'cost_of_sales': 15000}
+    'Outlander': VehicleModel.from_prices(30000, 25000),
+    'RVR': VehicleModel.from_prices(24000, 20000),
+    'Eclipse Cross': VehicleModel.from_prices(28000, 24000),
+    'Mirage': VehicleModel.from_prices(18000, 15000)
 }
-COMMISSION_RATE = 0.05
 
-for model, data in BUSINESS_LOGIC.items():
-    revenue = data['revenue']
-    cost = data['cost_of_sales']
-    commission = revenue * COMMISSION_RATE
-    data['profit_per_unit'] = revenue - cost - commission
-PROFITABLE_MODELS = sorted(BUSINESS_LOGIC.items(), key=lambda item: item[1]['profit_per_unit'], reverse=True)
+# The same assumptions as parallel arrays, one entry per model, so per-model
+# calculations can be done with NumPy instead of looping over the dict.
+MODEL_NAMES = np.array(list(BUSINESS_LOGIC))
+MODEL_REVENUE = np.array([vehicle.revenue for vehicle in BUSINESS_LOGIC.values()])
+MODEL_COST = np.array([vehicle.cost_of_sales for vehicle in BUSINESS_LOGIC.values()])
+MODEL_PROFIT_PER_UNIT = np.array([vehicle.profit_per_unit for vehicle in BUSINESS_LOGIC.values()])
+MODEL_PROFIT_ORDER = np.argsort(-MODEL_PROFIT_PER_UNIT, kind='stable')
+
+# --- BASELINE FORECAST (CACHED) ---
+@st.cache_resource(show_spinner=False)
+def forecast_model(_model, name, model_filepath, model_mtime, steps=3):
+    """
+    Returns the forecast of one model. It is cached per model name and model
+    file version, so it survives reruns and a rebuild of the baseline table.
+    """
+    return _model.forecast(steps=steps)
+
+@st.cache_data(show_spinner=False)
+def build_baseline_forecast(_models, model_filepath, model_mtime):
+    """
+    Runs every model's 3-month forecast and assembles the summary table,
+    along with the month labels for the sidebar and a map from each label
+    back to its date. The result is cached on the model file's path and
+    modification time, so reruns triggered by widgets reuse it instead of
+    re-forecasting, and a changed file gets a fresh table.
+    """
+    baseline_forecasts = {}
+    for name, model in _models.items():
+        forecast = forecast_model(model, name, model_filepath, model_mtime)
+        if name in BUSINESS_LOGIC:
+            forecast = forecast.fillna(0).round(0).astype(int)
+        baseline_forecasts[name] = forecast
+
+    columns = {
+        'Revenue': baseline_forecasts['Currency:Revenue/Sales'],
+        'Expense': baseline_forecasts['Currency:Expense'],
+        'Payroll': baseline_forecasts['Currency:Payroll/Compensation'],
+    }
+    for model_name in BUSINESS_LOGIC:
+        if model_name in baseline_forecasts:
+            columns[f'{model_name}_Units'] = baseline_forecasts[model_name]
+    df_summary = pd.concat(columns, axis=1)
+    # Dollar figures fit comfortably in int32 and unit counts in int16. Missing
+    # currency forecasts are filled with 0, as the unit forecasts already are,
+    # since NaN cannot be cast to an integer.
+    df_summary = df_summary.fillna(0).round(0).astype(
+        {column: 'int16' if column.endswith('_Units') else 'int32' for column in df_summary.columns}
+    )
+    df_summary['Profit'] = df_summary['Revenue'] - (df_summary['Expense'] + df_summary['Payroll'])
+
+    month_strings = list(df_summary.index.strftime('%B %Y'))
+    month_map = dict(zip(month_strings, df_summary.index))
+    return df_summary, month_strings, month_map
+
+# --- DISPLAY HELPERS ---
+def format_for_display(df):
+    """Formats every value with thousands separators, ready to display as text."""
+    return df.apply(lambda column: column.map('{:,.0f}'.format))
+
+HIGHLIGHTED_TABLE_CSS = """
+<style>
+.highlighted-table tbody tr { background-color: #d1e7dd; }
+.highlighted-table tbody td { text-align: right; }
+</style>
+"""
+
+def render_highlighted_table(df):
+    """Renders a small table as plain HTML with its rows highlighted."""
+    formatted = format_for_display(df)
+    header = ''.join(f'<th>{column}</th>' for column in formatted.columns)
+    rows = ''.join(
+        f'<tr><th>{index.date()}</th>' + ''.join(f'<td>{value}</td>' for value in values) + '</tr>'
+        for index, values in zip(formatted.index, formatted.values)
+    )
+    st.markdown(HIGHLIGHTED_TABLE_CSS
+                + f'<table class="highlighted-table"><thead><tr><th></th>{header}</tr></thead>'
+                + f'<tbody>{rows}</tbody></table>',
+                unsafe_allow_html=True)
 
 # --- 3. MAIN APPLICATION FUNCTION ---
 def run_planner_app():
@@ -61,21 +152,9 @@ def run_planner_app():
 
     if models:
         # --- 4. GENERATE BASELINE FORECAST ---
-        baseline_forecasts = {}
-        for name, model in models.items():
-            forecast = model.forecast(steps=3)
-            if name in BUSINESS_LOGIC:
-                forecast = forecast.fillna(0).round(0).astype(int)
-            baseline_forecasts[name] = forecast
-
-        df_summary = pd.DataFrame(index=baseline_forecasts['Currency:Revenue/Sales'].index)
-        df_summary['Revenue'] = baseline_forecasts['Currency:Revenue/Sales']
-        df_summary['Expense'] = baseline_forecasts['Currency:Expense']
-        df_summary['Payroll'] = baseline_forecasts['Currency:Payroll/Compensation']
-        for model_name in BUSINESS_LOGIC:
-            if model_name in baseline_forecasts:
-                df_summary[f'{model_name}_Units'] = baseline_forecasts[model_name]
-        df_summary['Profit'] = df_summary['Revenue'] - (df_summary['Expense'] + df_summary['Payroll'])
+        df_summary, month_strings, month_map = build_baseline_forecast(
+            models, MODEL_FILEPATH, os.path.getmtime(MODEL_FILEPATH)
+        )
 
         # --- 5. SIDEBAR FOR NAVIGATION ---
         st.sidebar.title("Navigation")
@@ -84,102 +163,103 @@ def run_planner_app():
         st.sidebar.header("Select Month")
         target_month_str = st.sidebar.selectbox(
             'Select a month to plan for:',
-            options=df_summary.index.strftime('%B %Y')
+            options=month_strings
         )
-        target_month_date = pd.to_datetime(target_month_str)
+        target_month_date = month_map[target_month_str]
 
         # --- 6. MAIN APP LOGIC ---
         st.header('Baseline 3-Month Forecast')
-        st.dataframe(df_summary.style.format(formatter="{:,.0f}").set_properties(**{'text-align': 'right'}))
+        # Numeric columns stay right-aligned; thousands separators come from the column format.
+        st.dataframe(df_summary, column_config={
+            column: st.column_config.NumberColumn(format='localized') for column in df_summary.columns
+        })
+
+        # Changes to the target month, applied to a plain dict copy of that row
+        # so the cached baseline frame is never copied or mutated. The values are
+        # Python ints so planner arithmetic cannot overflow the narrow stored dtypes.
+        row = {column: int(value) for column, value in df_summary.loc[target_month_date].items()}
+        delta = {}
 
-        df_updated = df_summary.copy()
-        
         if planner_mode == 'What-If Scenario':
             st.header('What-If Scenario Planner')
-            st.write("Adjust the sliders to see the impact of selling more vehicles.")
+            st.write("Adjust the sliders and click Apply to see the impact of selling more vehicles.")
 
             adjustments = {}
+            # Sliders inside a form only trigger a rerun when the changes are applied together.
             with st.expander("Adjust Vehicle Sales Units", expanded=True):
-                for model_name in BUSINESS_LOGIC:
-                    if model_name in models:
-                        adjustments[model_name] = st.slider(f"Additional '{model_name}' units:", 0, 50, 0, 1)
-            
-            total_revenue_change, total_cost_change, total_payroll_change = 0, 0, 0
-            for model_name, additional_units in adjustments.items():
-                if additional_units > 0:
-                    revenue_change = additional_units * BUSINESS_LOGIC[model_name]['revenue']
-                    cost_change = additional_units * BUSINESS_LOGIC[model_name]['cost_of_sales']
-                    total_revenue_change += revenue_change
-                    total_cost_change += cost_change
-                    total_payroll_change += revenue_change * COMMISSION_RATE
-                    df_updated.loc[target_month_date, f'{model_name}_Units'] += additional_units
-
-            df_updated.loc[target_month_date, 'Revenue'] += total_revenue_change
-            df_updated.loc[target_month_date, 'Expense'] += total_cost_change
-            df_updated.loc[target_month_date, 'Payroll'] += total_payroll_change
+                with st.form("whatif"):
+                    for model_name in BUSINESS_LOGIC:
+                        if model_name in models:
+                            adjustments[model_name] = st.slider(f"Additional '{model_name}' units:", 0, 50, 0, 1)
+                    st.form_submit_button("Apply")
+
+            # With every slider at zero the adjusted plan is the baseline, so there is nothing to compute or draw.
+            if not adjustments:
+                st.info("None of the vehicle models have a forecast to adjust.")
+            elif not any(adjustments.values()):
+                st.info("Set the sliders and click Apply to see the adjusted forecast.")
+            else:
+                units = np.array([adjustments.get(model_name, 0) for model_name in BUSINESS_LOGIC])
+                total_revenue_change = int(units @ MODEL_REVENUE)
+                for model_name, additional_units in adjustments.items():
+                    if additional_units > 0:
+                        delta[f'{model_name}_Units'] = additional_units
+
+                delta['Revenue'] = total_revenue_change
+                delta['Expense'] = int(units @ MODEL_COST)
+                delta['Payroll'] = round(total_revenue_change * COMMISSION_RATE)
 
         elif planner_mode == 'Target-Based Plan':
             st.header('Target-Based Planner')
-            baseline_profit = df_summary.loc[target_month_date, 'Profit']
+            baseline_profit = row['Profit']
             profit_target = st.number_input(f'Enter your profit target for {target_month_str}:',
-                                            min_value=int(baseline_profit),
-                                            value=int(baseline_profit + 50000),
+                                            min_value=baseline_profit,
+                                            value=baseline_profit + 50000,
                                             step=1000, format="%d")
             profit_gap = profit_target - baseline_profit
 
             if profit_gap > 0:
-                units_to_sell = {}
-                remaining_gap = profit_gap
-                for model_name, data in PROFITABLE_MODELS:
-                    if model_name not in models: continue
-                    profit_per_unit = data['profit_per_unit']
-                    if remaining_gap > 0 and profit_per_unit > 0:
-                        additional_units = math.ceil(remaining_gap / profit_per_unit)
-                        units_to_sell[model_name] = additional_units
-                        revenue_change = additional_units * data['revenue']
-                        cost_change = additional_units * data['cost_of_sales']
-                        payroll_change = revenue_change * COMMISSION_RATE
-                        df_updated.loc[target_month_date, f'{model_name}_Units'] += additional_units
-                        df_updated.loc[target_month_date, 'Revenue'] += revenue_change
-                        df_updated.loc[target_month_date, 'Expense'] += cost_change
-                        df_updated.loc[target_month_date, 'Payroll'] += payroll_change
-                        remaining_gap = 0
-                
-                st.subheader("Action Plan:")
-                cols = st.columns(len(units_to_sell))
-                for i, (model, units) in enumerate(units_to_sell.items()):
-                    cols[i].metric(label=f"Sell more '{model}'", value=f"{units} units")
+                # The whole gap is covered by the most profitable model that has a forecast.
+                eligible = np.isin(MODEL_NAMES, list(models)) & (MODEL_PROFIT_PER_UNIT > 0)
+                candidates = MODEL_PROFIT_ORDER[eligible[MODEL_PROFIT_ORDER]]
+                if candidates.size:
+                    idx = candidates[0]
+                    model_name = str(MODEL_NAMES[idx])
+                    additional_units = -(-profit_gap // int(MODEL_PROFIT_PER_UNIT[idx]))
+                    revenue_change = additional_units * int(MODEL_REVENUE[idx])
+                    delta[f'{model_name}_Units'] = additional_units
+                    delta['Revenue'] = revenue_change
+                    delta['Expense'] = additional_units * int(MODEL_COST[idx])
+                    delta['Payroll'] = round(revenue_change * COMMISSION_RATE)
+
+                    st.subheader("Action Plan:")
+                    st.metric(label=f"Sell more '{model_name}'", value=f"{additional_units} units")
+                else:
+                    st.warning("No forecast vehicle model can close the gap to this profit target.")
+            else:
+                st.info("No changes from baseline.")
+
+        # Each mode has already told the user why nothing changed.
+        if not delta:
+            return
 
         # --- 7. FINAL CALCULATIONS AND DISPLAY ---
-        df_updated['Profit'] = df_updated['Revenue'] - (df_updated['Expense'] + df_updated['Payroll'])
+        for column, change in delta.items():
+            row[column] += change
+        row['Profit'] = row['Revenue'] - (row['Expense'] + row['Payroll'])
         
         st.subheader(f'Final Adjusted Forecast for {target_month_str}')
         
-        final_plan_display = df_updated.loc[[target_month_date]]
-        
-        def highlight_row(row):
-            return ['background-color: #d1e7dd'] * len(row)
-
-        st.dataframe(final_plan_display.style.format(formatter="{:,.0f}").set_properties(**{'text-align': 'right'}).apply(highlight_row, axis=1))
+        final_plan_display = pd.DataFrame([row], index=[target_month_date])
+        render_highlighted_table(final_plan_display)
 
         # --- 8. VISUALIZATION ---
         st.subheader('Visual Comparison')
-        baseline_profit = df_summary.loc[target_month_date, 'Profit']
-        adjusted_profit = df_updated.loc[target_month_date, 'Profit']
+        baseline_profit = int(df_summary.loc[target_month_date, 'Profit'])
+        adjusted_profit = row['Profit']
         
-        chart_data = pd.DataFrame({
-            'Plan': ['Baseline Forecast', 'Adjusted Plan'],
-            'Profit': [baseline_profit, adjusted_profit]
-        })
-        
-        chart = alt.Chart(chart_data).mark_bar().encode(
-            x=alt.X('Plan', sort=None),
-            y='Profit',
-            color=alt.Color('Plan', scale=alt.Scale(range=['#4c78a8', '#54a24b']))
-        ).properties(
-            title=f'Profit Comparison for {target_month_str}'
-        )
-        st.altair_chart(chart, use_container_width=True)
+        st.metric(f'Adjusted Plan Profit for {target_month_str}', f'{adjusted_profit:,.0f}',
+                  delta=f'{adjusted_profit - baseline_profit:,.0f} vs Baseline Forecast')
 
 # --- INTRODUCTION PAGE ---
 def introduction_page():